@@ -4,6 +4,7 @@ use std::path::PathBuf;
 use sudoku::*;
 
 mod schedule;
+mod server;
 mod solver;
 
 const HEADER: &'static str = r#"annealing solver for sudoku
@@ -12,17 +13,21 @@ const HEADER: &'static str = r#"annealing solver for sudoku
 const USAGE: &'static str = r#"
 Usage:
     annealing <input file> <schedule file> [<init file>]
+    annealing --batch
     annealing --help
 
 Options:
+    --batch             Anneal a stream of frames read from stdin, several at
+                        once.
     --help              Print help information.
 "#;
 
 const LONG_HELP: &'static str = concat!(
     r#"
 An input file of "-" denotes the input data should be read from the standard
-input. The schedule file is expected to be in .schedule format, and the input
-file and init file are expected to be in .soduku format.
+input. At most one of the files can be "-"; see --batch below to send them all
+through the standard input. The schedule file is expected to be in .schedule
+format, and the input file and init file are expected to be in .soduku format.
 
 If the annealing is successfully carried out, the program will print to stdout
 a single line denoting the success of the anneal, followed by the final state in
@@ -51,6 +56,29 @@ Floating point numbers take the format (in loose BNF notation):
     integer ~= (+|-)?\d+
     decimal ~= \.\d+
 
+In --batch mode the program does not exit after a single anneal. Instead, it
+repeatedly reads a frame from stdin, of the form
+
+    <(integer) index>[\t<time budget in milliseconds>]
+    <input, in .sudoku format>
+    ---
+    <init, in .sudoku format, or nothing>
+    ---
+    <schedule, in .schedule format>
+    ===
+
+and exits with code 0 when stdin is closed. This saves the cost of starting a
+new process for each (re)anneal. Frames are annealed in parallel, by one thread
+per physical core (taken to be half the logical cores), and an anneal that runs
+past its budget is stopped early, with the success message
+
+    TIMEOUT     The anneal ran out of time; the state it got to is given below.
+
+Answers are given as soon as each anneal finishes, and so may be out of order.
+Each answer starts with a line with the index, the success message, and the
+time in milliseconds taken by the anneal, separated by tabs, followed by the
+final state and a line reading "===".
+
 "#,
     include_str!("../../FORMATTING.txt")
 );
@@ -61,6 +89,7 @@ fn main() {
     let mut schedule: Option<Result<Schedule, String>> = None;
     let mut input: Option<Result<Sudoku, String>> = None;
     let mut init_hint: Option<Result<Sudoku, String>> = None;
+    let mut read_stdin = false;
 
     while let Some(arg) = args.next() {
         match arg.as_str() {
@@ -70,7 +99,21 @@ fn main() {
                 println!("{}", LONG_HELP);
                 std::process::exit(0);
             }
+            "--batch" => {
+                server::serve_batch();
+                std::process::exit(0);
+            }
             "-" => {
+                // Whatever came first will have consumed all of stdin.
+                if read_stdin {
+                    eprintln!(concat!(
+                        "Only one of the inputs can be read from stdin.\n",
+                        "Use --batch to send them all through stdin."
+                    ));
+                    std::process::exit(1);
+                }
+                read_stdin = true;
+
                 if input.is_none() {
                     input = Some(parsing::sudoku::parse(std::io::stdin()));
                 } else if schedule.is_none() {
@@ -164,23 +207,12 @@ fn main() {
         }
         Err(SolveError::Glassed) => {
             println!("GLASS");
-            eprintln!(concat!(
-                "The board cooled down to an unfeasible state.\n",
-                "Perhaps you can start from this state and re-anneal?"
-            ));
+            eprintln!("{}", SolveError::Glassed);
             println!("{}", input);
             std::process::exit(0);
         }
-        Err(SolveError::EmptyHint) => {
-            eprintln!("The hint input had empty spaces. This is not allowed.");
-            std::process::exit(1);
-        }
-        Err(SolveError::IncompatibleHint) => {
-            eprintln!("The hint input is not compatible with the input's clues.");
-            std::process::exit(1);
-        }
-        Err(SolveError::Infeasible) => {
-            eprintln!("The input is infeasible.");
+        Err(e) => {
+            eprintln!("{}", e);
             std::process::exit(1);
         }
     }
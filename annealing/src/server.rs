@@ -0,0 +1,192 @@
+use crate::schedule::{self, Schedule};
+use crate::solver::{self, SolveError};
+use std::io::{BufRead, Write};
+use std::sync::{mpsc, Arc, Mutex};
+use std::thread;
+use std::time;
+use sudoku::*;
+
+const SECTION_END: &'static str = "---";
+const FRAME_END: &'static str = "===";
+
+struct Frame {
+    puzzle: String,
+    hint: String,
+    schedule: String,
+}
+
+/// Anneal frames read from stdin until it is closed. See the --help screen
+/// for the frame format.
+///
+/// Each frame is preceded by a line with its index, and optionally a time
+/// budget in milliseconds, separated by a tab. The frames are handed out to a
+/// pool of worker threads, which give up on an anneal once its budget runs
+/// out. Answers are written as soon as they are ready, and so may come out of
+/// order; they are preceded by a line with the frame's index, the success
+/// message, and the time taken by the anneal, in milliseconds, separated by
+/// tabs.
+pub fn serve_batch() {
+    let stdin = std::io::stdin();
+    let mut input = stdin.lock();
+
+    let (frame_tx, frame_rx) = mpsc::channel::<(usize, Option<time::Duration>, Frame)>();
+    let frame_rx = Arc::new(Mutex::new(frame_rx));
+    let thread_count = thread::available_parallelism().unwrap().get() / 2;
+
+    let workers = (0..thread_count.max(1))
+        .map(|_| {
+            let frame_rx = frame_rx.clone();
+            thread::spawn(move || loop {
+                // Only hold the lock while waiting for a frame, not while
+                // annealing it.
+                let next = frame_rx.lock().unwrap().recv();
+                let (index, budget, frame) = match next {
+                    Ok(next) => next,
+                    Err(_) => return, // No more frames.
+                };
+
+                let deadline = budget.map(|budget| time::Instant::now() + budget);
+                let (state, board, elapsed) = anneal_frame(&frame, deadline);
+
+                let stdout = std::io::stdout();
+                let mut output = stdout.lock();
+                writeln!(
+                    output,
+                    "{}\t{}\t{}\n{}\n{}",
+                    index,
+                    state,
+                    elapsed.as_secs_f64() * 1000.,
+                    board,
+                    FRAME_END
+                )
+                .and_then(|_| output.flush())
+                .unwrap_or_else(|e| {
+                    fail(&format!("Could not write to stdout.\nWith error {}", e))
+                });
+            })
+        })
+        .collect::<Vec<_>>();
+
+    loop {
+        let mut line = String::new();
+        match input.read_line(&mut line) {
+            Ok(0) => break,
+            Ok(_) => {}
+            Err(e) => fail(&format!("Could not read from stdin.\nWith error {}", e)),
+        }
+        if line.trim().is_empty() {
+            continue;
+        }
+        let mut fields = line.trim().split('\t');
+        let index = fields
+            .next()
+            .and_then(|index| index.parse::<usize>().ok())
+            .unwrap_or_else(|| fail(&format!("Expected a frame index, found '{}'.", line.trim())));
+        let budget = fields.next().map(|budget| {
+            budget
+                .parse::<f64>()
+                .ok()
+                .filter(|budget| *budget >= 0.)
+                .map(|budget| time::Duration::from_secs_f64(budget / 1000.))
+                .unwrap_or_else(|| fail(&format!("Expected a time budget, found '{}'.", budget)))
+        });
+
+        match read_frame(&mut input) {
+            Some(frame) => frame_tx.send((index, budget, frame)).unwrap(),
+            None => fail("Unexpected end of input in the middle of a frame."),
+        }
+    }
+
+    drop(frame_tx);
+    for worker in workers {
+        worker.join().ok();
+    }
+}
+
+/// Read the next frame from `input`, or return None if it was closed in
+/// between frames.
+fn read_frame<B: BufRead>(input: &mut B) -> Option<Frame> {
+    let mut frame = Frame {
+        puzzle: String::new(),
+        hint: String::new(),
+        schedule: String::new(),
+    };
+
+    if !read_section(input, SECTION_END, &mut frame.puzzle) {
+        if frame.puzzle.trim().is_empty() {
+            return None;
+        }
+        fail("Unexpected end of input in the middle of a frame.");
+    }
+    if !read_section(input, SECTION_END, &mut frame.hint)
+        || !read_section(input, FRAME_END, &mut frame.schedule)
+    {
+        fail("Unexpected end of input in the middle of a frame.");
+    }
+
+    Some(frame)
+}
+
+/// Read lines into `into` until a line reading `delimiter` is found.
+/// Returns false if stdin was closed before the delimiter was seen.
+fn read_section<B: BufRead>(input: &mut B, delimiter: &str, into: &mut String) -> bool {
+    into.clear();
+    let mut line = String::new();
+    loop {
+        line.clear();
+        match input.read_line(&mut line) {
+            Ok(0) => return false,
+            Ok(_) => {}
+            Err(e) => fail(&format!("Could not read from stdin.\nWith error {}", e)),
+        }
+        if line.trim_end() == delimiter {
+            return true;
+        }
+        into.push_str(&line);
+    }
+}
+
+fn anneal_frame(
+    frame: &Frame,
+    deadline: Option<time::Instant>,
+) -> (&'static str, Sudoku, time::Duration) {
+    let (mut board, init_hint, schedule) = parse_frame(frame);
+
+    let now = time::Instant::now();
+    let state = match solver::anneal_until(&mut board, schedule, init_hint, deadline) {
+        Ok(()) => "SUCCESS",
+        Err(SolveError::Glassed) => "GLASS",
+        Err(SolveError::TimedOut) => "TIMEOUT",
+        Err(e) => fail(&e.to_string()),
+    };
+    let elapsed = now.elapsed();
+
+    (state, board, elapsed)
+}
+
+fn parse_frame(frame: &Frame) -> (Sudoku, Option<Sudoku>, Schedule) {
+    let puzzle = parsing::sudoku::parse(frame.puzzle.trim().as_bytes()).unwrap_or_else(|e| {
+        fail(&format!("Input board malformed.\n{}", e));
+    });
+
+    let hint = if frame.hint.trim().is_empty() {
+        None
+    } else {
+        Some(
+            parsing::sudoku::parse(frame.hint.trim().as_bytes()).unwrap_or_else(|e| {
+                fail(&format!("Init board malformed.\n{}", e));
+            }),
+        )
+    };
+
+    let schedule = schedule::parse(frame.schedule.trim().as_bytes()).unwrap_or_else(|e| {
+        fail(&format!("Schedule format malformed.\n{}", e));
+    });
+
+    (puzzle, hint, schedule)
+}
+
+fn fail(message: &str) -> ! {
+    eprintln!("{}", message);
+    std::process::exit(1);
+}
@@ -1,5 +1,6 @@
 use crate::schedule::Schedule;
 use itertools::Itertools;
+use std::time::Instant;
 use sudoku::{Sudoku, SudokuCell, SudokuCellValue};
 
 pub enum SolveError {
@@ -7,12 +8,45 @@ pub enum SolveError {
     EmptyHint,
     IncompatibleHint,
     Infeasible,
+    TimedOut,
+}
+
+impl std::fmt::Display for SolveError {
+    fn fmt(&self, f: &mut std::fmt::Formatter<'_>) -> std::fmt::Result {
+        match self {
+            SolveError::Glassed => write!(
+                f,
+                concat!(
+                    "The board cooled down to an unfeasible state.\n",
+                    "Perhaps you can start from this state and re-anneal?"
+                )
+            ),
+            SolveError::EmptyHint => {
+                write!(f, "The hint input had empty spaces. This is not allowed.")
+            }
+            SolveError::IncompatibleHint => {
+                write!(f, "The hint input is not compatible with the input's clues.")
+            }
+            SolveError::Infeasible => write!(f, "The input is infeasible."),
+            SolveError::TimedOut => write!(f, "The anneal ran out of time."),
+        }
+    }
 }
 
 pub fn anneal(
     sudoku: &mut Sudoku,
     schedule: Schedule,
     init: Option<Sudoku>,
+) -> Result<(), SolveError> {
+    anneal_until(sudoku, schedule, init, None)
+}
+
+/// Like `anneal`, but give up once `deadline` (if any) has passed.
+pub fn anneal_until(
+    sudoku: &mut Sudoku,
+    schedule: Schedule,
+    init: Option<Sudoku>,
+    deadline: Option<Instant>,
 ) -> Result<(), SolveError> {
     // Start by filling in the board.
 
@@ -59,12 +93,22 @@ pub fn anneal(
     // a new microstate is accepted during the annealing step
     let mut current_score: usize = violation_count.iter().sum();
 
-    for &temperature in schedule.run() {
+    for (step, &temperature) in schedule.run().enumerate() {
         if current_score == 0 {
             // No violations, we lucked into the ground state!
             break;
         }
 
+        // Checking the clock is comparatively expensive, so only do it every
+        // so often.
+        if step % 4096 == 4095 {
+            if let Some(deadline) = deadline {
+                if Instant::now() >= deadline {
+                    return Err(SolveError::TimedOut);
+                }
+            }
+        }
+
         // Find a potential new microstate
         // The new microstate is given by swapping two elements (that are not
         // fixed)
@@ -13,6 +13,7 @@ const HELP: &'static str = concat!(
 
 Usage:
     sudoku [--benchmark=<file>] <input file>
+    sudoku --benchmark-batch [--timeout=<seconds>]
     sudoku --help
 
 Options:
@@ -22,6 +23,12 @@ An input file of "-" denotes the input data should be read from the standard
 input.
 
 The input file is expected to be in .soduku format.
+
+With --benchmark-batch, several puzzles are read from the standard input,
+separated by lines reading "===". Each is benchmarked as with --benchmark,
+giving up on a run after --timeout seconds, if given. The results are written
+to the standard output, one puzzle per line, as
+    <puzzle index>\t<unsolved fraction>\t<average solve time (ms), or -1>
 "#,
     include_str!("../../FORMATTING.txt")
 );
@@ -31,6 +38,8 @@ fn main() {
 
     let mut input = None;
     let mut benchmark: Option<BufWriter<Box<dyn Write>>> = None;
+    let mut batch = false;
+    let mut timeout = None;
 
     while let Some(arg) = args.next() {
         match arg.as_str() {
@@ -38,6 +47,24 @@ fn main() {
                 println!("{}", HELP);
                 std::process::exit(0);
             }
+            "--benchmark-batch" => {
+                batch = true;
+            }
+            other if other.starts_with("--timeout") => {
+                let seconds = match other.strip_prefix("--timeout=") {
+                    Some(seconds) => Some(seconds.to_string()),
+                    None => args.next(),
+                };
+                // Negative, non-finite or overly large values can't make a Duration.
+                let seconds = seconds.and_then(|seconds| seconds.parse::<f64>().ok());
+                timeout = match seconds.map(std::time::Duration::try_from_secs_f64) {
+                    Some(Ok(timeout)) => Some(timeout),
+                    _ => {
+                        eprintln!("--timeout expects a number of seconds.");
+                        std::process::exit(1);
+                    }
+                };
+            }
             "-" => {
                 input = Some(parsing::sudoku::parse(std::io::stdin()));
             }
@@ -99,6 +126,11 @@ fn main() {
         }
     }
 
+    if batch {
+        run_benchmark_batch(timeout);
+        std::process::exit(0);
+    }
+
     if input.is_none() {
         eprintln!("{}", HELP);
         std::process::exit(1);
@@ -135,6 +167,7 @@ fn run(mut input: sudoku::Sudoku) {
             );
             std::process::exit(1);
         }
+        Err(SolveError::TimedOut) => unreachable!(), // There is no deadline.
     }
 }
 
@@ -185,3 +218,65 @@ fn run_benchmark<O: Write>(input: sudoku::Sudoku, mut out: BufWriter<O>) {
 
     out.flush().unwrap();
 }
+
+fn run_benchmark_batch(timeout: Option<std::time::Duration>) {
+    use std::io::Read;
+    use std::sync::mpsc;
+    use std::thread;
+    use std::time;
+
+    let mut puzzles = String::new();
+    if let Err(e) = std::io::stdin().read_to_string(&mut puzzles) {
+        eprintln!("Could not read from stdin.\nWith error {}", e);
+        std::process::exit(1);
+    }
+
+    let thread_count = (thread::available_parallelism().unwrap().get() / 2).max(1);
+    let mut out = BufWriter::new(std::io::stdout());
+
+    let chunks = puzzles
+        .split("\n===")
+        .map(|chunk| chunk.trim())
+        .filter(|chunk| !chunk.is_empty());
+
+    for (index, chunk) in chunks.enumerate() {
+        let input = match parsing::sudoku::parse(chunk.as_bytes()) {
+            Ok(input) => input,
+            Err(e) => {
+                eprintln!("Input board {} malformed.\n{}", index, e);
+                std::process::exit(1);
+            }
+        };
+
+        let (time_tx, time_rx) = mpsc::channel::<Option<f64>>();
+        let deadline = timeout.map(|timeout| time::Instant::now() + timeout);
+        for _thread in 0..thread_count {
+            let time_tx = time_tx.clone();
+            let mut input = input.clone();
+            thread::spawn(move || {
+                let now = time::Instant::now();
+                let result = solver::backtrack_until(&mut input, deadline);
+                let elapsed = now.elapsed().as_secs_f64() * 1000.;
+                match result {
+                    Ok(()) => time_tx.send(Some(elapsed)),
+                    Err(_) => time_tx.send(None),
+                }
+                .ok();
+            });
+        }
+        drop(time_tx);
+
+        let times = time_rx.iter().collect::<Vec<_>>();
+        let solved = times.iter().flatten().collect::<Vec<_>>();
+        let unsolved = (times.len() - solved.len()) as f64 / times.len() as f64;
+        let average = if solved.is_empty() {
+            -1.
+        } else {
+            solved.iter().copied().sum::<f64>() / solved.len() as f64
+        };
+
+        writeln!(out, "{}\t{}\t{}", index, unsolved, average)
+            .and_then(|_| out.flush())
+            .unwrap();
+    }
+}
@@ -1,13 +1,20 @@
 use itertools::Itertools;
 use rand::{prelude::SliceRandom, thread_rng};
 use std::collections::BTreeSet;
+use std::time::Instant;
 use sudoku::{Sudoku, SudokuCell, SudokuCellValue};
 
 pub enum SolveError {
     Infeasible,
+    TimedOut,
 }
 
 pub fn backtrack(sudoku: &mut Sudoku) -> Result<(), SolveError> {
+    backtrack_until(sudoku, None)
+}
+
+/// Like `backtrack`, but give up once `deadline` (if any) has passed.
+pub fn backtrack_until(sudoku: &mut Sudoku, deadline: Option<Instant>) -> Result<(), SolveError> {
     // Start by making a list of compatible digits
     let side = sudoku.side();
     let box_side = sudoku.box_side();
@@ -80,7 +87,19 @@ pub fn backtrack(sudoku: &mut Sudoku) -> Result<(), SolveError> {
     // Start doing the backtracking
     let mut depth = 0; // The index of the string character being tested.
     let mut pointer = vec![0_usize; indices.len()]; // The character being tested, for each depth.
+    let mut steps = 0_usize;
     loop {
+        // Checking the clock is comparatively expensive, so only do it every
+        // so often.
+        steps += 1;
+        if steps % 4096 == 0 {
+            if let Some(deadline) = deadline {
+                if Instant::now() >= deadline {
+                    return Err(SolveError::TimedOut);
+                }
+            }
+        }
+
         // Have we exhausted the possibilities at this depth?
         if pointer[depth] == compatible[depth].len() {
             if depth == 0 {
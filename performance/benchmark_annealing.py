@@ -13,362 +13,228 @@ Options:
     --help      Show this screen.
 """
 
+import io
 import os
-import shutil
-import time
-import copy
 import random
-import concurrent.futures
+import itertools
+import functools
 import numpy as np
 from glob import glob
-from tempfile import NamedTemporaryFile
-from subprocess import run, TimeoutExpired
+from subprocess import Popen, PIPE
 from docopt import docopt
+from common import ensure_built, load_top1465, write_log
 
 
 def main():
     arguments = docopt(__doc__)
 
-    run('cargo build --release', shell=True)
+    ensure_built('annealing')
 
     if arguments['paper']:
-        if arguments['--remelt']:
-            benchmark_paper_remelt()
-        else:
-            benchmark_paper_geometric()
+        name = 'paper'
+        puzzles = load_paper()
     elif arguments['top1465']:
-        if arguments['--remelt']:
-            benchmark_top1465_remelt()
-        else:
-            benchmark_top1465_geometric()
+        name = 'top1465'
+        puzzles = load_top1465()
     else:
         print('What?')
-
-
-def benchmark_paper_remelt():
-    if os.path.exists('annealing.remelt.paper.log'):
-        shutil.copy('annealing.remelt.paper.log',
-                    f'annealing.remelt.paper.log.{random.randint(0, 1000)}.bak')
-        os.remove('annealing.remelt.paper.log')
-
-    orig_schedule = np.loadtxt('remelt.schedule', delimiter='\t')
-
-    with open('annealing.remelt.paper.log', 'w') as outfile:
-        outfile.write(
-            '# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
-        for i, puzzlefile in enumerate(glob('paper/*.sudoku')):
-            times = np.array([-1., -1., -1., -1.])
-            for iteration in range(4):
-                with NamedTemporaryFile(delete=True) as hintfile:
-                    # Give ourselves 1m30s.
-                    # Use a geometric schedule with 100_000 iterations total each round
-                    # Start with a starting temperature of 1.,
-                    # then every new round halve scale the curve by 1/2.
-                    start_time = time.perf_counter()
-                    start_temp = 20.
-                    args = []
-                    while True:
-                        if time.perf_counter() - start_time > 90:
-                            break
-
-                        if start_temp < 0.5:
-                            start_temp = 20.
-                            args = []
-                        else:
-                            start_temp *= 0.5
-
-                        schedule = orig_schedule.copy()
-                        schedule[:,0] *= start_temp
-                        schedule = '\n'.join('%.6g\t%d' % (line[0], line[1]) for line in schedule)
-
-                        try:
-                            result = run(
-                                ['../target/release/annealing', puzzlefile, '-', *args],
-                                input=schedule.encode('utf-8'),
-                                timeout=(start_time + 90 - time.perf_counter()),
-                                capture_output=True)
-                        except TimeoutExpired:
-                            break
-
-                        if result.returncode != 0:
-                            raise Exception(result.stdout.decode('utf-8') +
-                                            '\n' + result.stderr.decode('utf-8'))
-
-                        output = result.stdout.decode('utf-8')
-                        state = output[:output.find('\n')].strip()
-                        final = output[output.find('\n')+1:].strip()
-
-                        if state == 'GLASS':
-                            start_temp *= .5
-                            hintfile.seek(0)
-                            hintfile.truncate()
-                            hintfile.write(final.encode('utf-8'))
-                            hintfile.flush()
-                            args = [hintfile.name]
-                            continue  # Reanneal
-                        elif state == 'SUCCESS':
-                            times[iteration] = (time.perf_counter() - start_time) * 1000
-                            break
-
-            print(times, flush=True)
-            outfile.write(
-                f'{i}\t'
-                f'{np.count_nonzero(times[times < 0.]) / 4.}\t'
-                f'{np.average(times[times >= 0.]) if not (times < 0).all() else 0.}\n')
-
-
-def benchmark_paper_geometric():
-    if os.path.exists('annealing.paper.log'):
-        shutil.copy('annealing.paper.log',
-                    f'annealing.paper.log.{random.randint(0, 1000)}.bak')
-        os.remove('annealing.paper.log')
-
-    with open('annealing.paper.log', 'w') as outfile:
-        outfile.write(
-            '# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
-        for i, puzzlefile in enumerate(glob('paper/*.sudoku')):
-            times = np.array([-1., -1., -1., -1.])
-            for iteration in range(4):
-                with NamedTemporaryFile(delete=True) as hintfile:
-                    # Give ourselves 1m30s.
-                    # Use a geometric schedule with 100_000 iterations total each round
-                    # Start with a starting temperature of 1.,
-                    # then every new round halve scale the curve by 1/2.
-                    start_time = time.perf_counter()
-                    start_temp = 20.
-                    args = []
-                    while True:
-                        if time.perf_counter() - start_time > 90:
-                            break
-
-                        if start_temp < 0.5:
-                            start_temp = 20.
-                            args = []
-
-                        schedule = ''
-                        temperature = copy.copy(start_temp)
-                        total_iters = 0
-                        iterations = 1
-                        while total_iters < 100_000:
-                            schedule += f'{temperature} {int(iterations)}\n'
-                            temperature *= 0.99
-                            iterations *= 1.01
-                            total_iters += iterations
-
-                        try:
-                            result = run(
-                                ['../target/release/annealing', puzzlefile, '-', *args],
-                                input=schedule.encode('utf-8'),
-                                timeout=(start_time + 90 - time.perf_counter()),
-                                capture_output=True)
-                        except TimeoutExpired:
-                            break
-
-                        if result.returncode != 0:
-                            raise Exception(result.stdout.decode('utf-8') +
-                                            '\n' + result.stderr.decode('utf-8'))
-
-                        output = result.stdout.decode('utf-8')
-                        state = output[:output.find('\n')].strip()
-                        final = output[output.find('\n')+1:].strip()
-
-                        if state == 'GLASS':
-                            start_temp *= .5
-                            hintfile.seek(0)
-                            hintfile.truncate()
-                            hintfile.write(final.encode('utf-8'))
-                            hintfile.flush()
-                            args = [hintfile.name]
-                            continue  # Reanneal
-                        elif state == 'SUCCESS':
-                            times[iteration] = (time.perf_counter() - start_time) * 1000
-                            break
-
-            print(times, flush=True)
-            outfile.write(
-                f'{i}\t'
-                f'{np.count_nonzero(times[times < 0.]) / 4.}\t'
-                f'{np.average(times[times >= 0.]) if (times >= 0.).any() else 0.}\n')
-
-
-def benchmark_top1465_geometric():
-    puzzles = []
-    with open('top1465', 'r') as top1465:
-        for puzzle in top1465.readlines():
-            puzzle = puzzle.strip()
-            if not puzzle:
-                continue
-            puzzle = '\n'.join(' '.join(puzzle.replace(
-                '.', '_')[i*9:(i+1)*9]) for i in range(9))
-            puzzles.append(puzzle)
+        return
 
     print('Finished parsing puzzles.')
 
-    if os.path.exists('annealing.top1465.log'):
-        shutil.copy('annealing.top1465.log',
-                    f'annealing.top1465.log.{random.randint(0, 1000)}.bak')
-        os.remove('annealing.top1465.log')
-
-    with open('annealing.top1465.log', 'w') as outfile:
-        outfile.write(
-            '# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
-        for i, puzzle in enumerate(puzzles):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                times = [*executor.map(_thread_top1465_geometric, (puzzle for _ in range(4)))]
-            times = np.array(times)
-            print(times, flush=True)
-            outfile.write(
-                f'{i}\t'
-                f'{np.count_nonzero(times[times < 0.]) / 4.}\t'
-                f'{np.average(times[times >= 0.])}\n')
-
-def _thread_top1465_geometric(puzzle):
-    with NamedTemporaryFile(delete=True) as puzzlefile, \
-            NamedTemporaryFile(delete=True) as hintfile:
-        puzzlefile.write(puzzle.encode('utf-8'))
-        puzzlefile.flush()
-
-        # Give ourselves 1m30s.
-        # Use a geometric schedule with 100_000 iterations total each round
-        # Start with a starting temperature of 1.,
-        # then every new round halve scale the curve by 1/2.
-        start_time = time.perf_counter()
-        start_temp = 20.
-        args = []
-        while True:
-            if time.perf_counter() - start_time > 90:
-                break
-
-            if start_temp < 0.5:
-                start_temp = 20.
-                args = []
-
-            schedule = ''
-            temperature = copy.copy(start_temp)
-            iterations = 1
-            total_iters = 0
-            while total_iters < 100_000:
-                schedule += f'{temperature} {int(iterations)}\n'
-                temperature *= 0.99
-                iterations *= 1.01
-                total_iters += iterations
-
-            try:
-                result = run(
-                    ['../target/release/annealing',
-                        puzzlefile.name, '-', *args],
-                    input=schedule.encode('utf-8'),
-                    timeout=(start_time + 90 - time.perf_counter()),
-                    capture_output=True)
-            except TimeoutExpired:
-                break
-                
-            if result.returncode != 0:
-                raise Exception(result.stdout.decode('utf-8') +
-                                '\n' + result.stderr.decode('utf-8'))
-
-            output = result.stdout.decode('utf-8')
-            state = output[:output.find('\n')].strip()
-            final = output[output.find('\n')+1:].strip()
-
-            if state == 'GLASS':
-                start_temp *= .5
-                hintfile.seek(0)
-                hintfile.truncate()
-                hintfile.write(final.encode('utf-8'))
-                hintfile.flush()
-                args = [hintfile.name]
-                continue  # Reanneal
-            elif state == 'SUCCESS':
-                return (time.perf_counter() - start_time) * 1000
-    return -1
-
-def benchmark_top1465_remelt():
+    # Use a schedule with 100_000 (geometric) or about 1_000_000 (remelt)
+    # iterations total each round. Start with a starting temperature of 20.,
+    # then every new round halve the scale of the curve.
+    if arguments['--remelt']:
+        run_bench(puzzles, remelt_schedule, halve_every_round=True,
+                  logfile=f'annealing.remelt.{name}.log')
+    else:
+        run_bench(puzzles, geometric_schedule, halve_every_round=False,
+                  logfile=f'annealing.{name}.log')
+
+
+class AnnealBatch:
+    """A long-lived `annealing --batch` process.
+
+    Frames are submitted with an index, and annealed in parallel by the
+    server's worker threads; `results` yields the answers as they come in.
+    """
+
+    def __init__(self):
+        self.proc = Popen(['../target/release/annealing', '--batch'],
+                          stdin=PIPE, stdout=PIPE)
+        self.outstanding = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+    def submit(self, index, budget_ms, puzzle, hint, schedule):
+        """Queue a frame, which the server will give up on (answering TIMEOUT)
+        after `budget_ms` milliseconds of annealing."""
+        self.proc.stdin.write(b'%d\t%.3f\n' % (index, budget_ms) + puzzle +
+                              b'\n---\n' + hint + b'\n---\n' + schedule +
+                              b'\n===\n')
+        self.proc.stdin.flush()
+        self.outstanding += 1
+
+    def _readline(self):
+        line = self.proc.stdout.readline()
+        if not line:
+            raise Exception(
+                f'annealing server exited with code {self.proc.wait()}')
+        return line
+
+    def results(self):
+        """Yield `(index, state, time_ms, final)` tuples until there are no
+        outstanding frames. Frames may be submitted while iterating.
+        """
+        while self.outstanding > 0:
+            index, state, time_ms = self._readline().split(b'\t')
+
+            # The board is only needed as the hint for a reanneal, which the
+            # server trims anyway, so it is passed on as raw bytes.
+            final = b''.join(iter(self._readline, b'===\n'))
+
+            self.outstanding -= 1
+            yield int(index), state.decode('utf-8'), float(time_ms), final
+
+
+# The geometric schedule for a starting temperature of 1.
+# Step k runs int(1.01**k) iterations at temperature 0.99**k, and steps are
+# added while the running total of 1.01**k (for k >= 1) is below 100_000. That
+# total is 101 * (1.01**k - 1), which gives the number of steps in closed form.
+_GEOMETRIC_STEPS = np.arange(int(np.log(1 + 100_000 / 101) / np.log(1.01)) + 1)
+_BASE_GEOMETRIC_SCHEDULE = np.column_stack(
+    [0.99**_GEOMETRIC_STEPS, (1.01**_GEOMETRIC_STEPS).astype(np.int64)])
+
+
+@functools.lru_cache(maxsize=None)
+def geometric_schedule(start_temp):
+    """Geometric schedule starting at `start_temp`, with 100_000 iterations
+    total, as bytes in .schedule format."""
+    # Starting temperatures are repeatedly halved from 20., so there are only
+    # a handful of them, and each is only ever formatted once.
+    schedule = _BASE_GEOMETRIC_SCHEDULE.copy()
+    schedule[:, 0] *= start_temp
+
+    buffer = io.BytesIO()
+    np.savetxt(buffer, schedule, fmt='%.9g %d')
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def _load_remelt_schedule():
+    """The remelt schedule's temperatures and iteration counts, as separate
+    columns. The schedule is only ever written to 6 significant figures, so
+    float32 temperatures are plenty."""
+    schedule = np.loadtxt('remelt.schedule', delimiter='\t', dtype=np.float32)
+    return schedule[:, 0].copy(), schedule[:, 1].astype(np.int64)
+
+
+@functools.lru_cache(maxsize=None)
+def remelt_schedule(start_temp):
+    """The remelt schedule (see remelt.schedule), with temperatures scaled by
+    `start_temp`, as bytes in .schedule format."""
+    temperatures, iterations = _load_remelt_schedule()
+
+    buffer = io.BytesIO()
+    np.savetxt(buffer,
+               np.column_stack([temperatures * np.float32(start_temp),
+                                iterations]),
+               fmt='%.6g\t%d')
+    return buffer.getvalue()
+
+
+def load_paper():
+    """Read the puzzles in paper/, as a list of bytes in .sudoku format."""
     puzzles = []
-    with open('top1465', 'r') as top1465:
-        for puzzle in top1465.readlines():
-            puzzle = puzzle.strip()
-            if not puzzle:
+    for puzzlefile in glob('paper/*.sudoku'):
+        with open(puzzlefile, 'rb') as puzzlebuf:
+            puzzles.append(puzzlebuf.read())
+    return puzzles
+
+
+def run_bench(puzzles, schedule, halve_every_round, logfile):
+    """Anneal each of `puzzles` 4 times (see `_batch_anneal`), and write the
+    results to `logfile`, backing up any previous log."""
+    if os.path.exists(logfile):
+        os.rename(logfile, f'{logfile}.{random.randint(0, 1000)}.bak')
+
+    times = _batch_anneal(puzzles, schedule, halve_every_round)
+
+    write_log(logfile, times)
+
+
+# How long each run may spend annealing before it counts as failed.
+_BUDGET_MS = 90 * 1000
+
+
+def _batch_anneal(puzzles, schedule, halve_every_round):
+    """Anneal each puzzle 4 times through a single batch server, reannealing
+    with `schedule(start_temp)` until solved or out of time.
+
+    The starting temperature is halved after each glassy round (and, if
+    `halve_every_round`, also at the start of every round), and brought back
+    to 20 once it falls below 0.5.
+
+    Each run has a budget of 90 s of annealing; runs that do not succeed
+    within it are failed.
+
+    Returns a (puzzles, 4) array of solve times in ms, or -1 for failed runs.
+    """
+    # Each of the 4 runs of each puzzle is an independent job. The batch server
+    # anneals several jobs at once, one per core; as soon as it answers for a
+    # job, we submit its next round, so that its workers are never left idle.
+    # Since jobs share the CPU, each is timed by the sum of its anneal times,
+    # rather than by the wall clock.
+    job_count = len(puzzles) * 4
+    times = np.full((len(puzzles), 4), -1.)
+    elapsed = np.zeros(job_count)
+    start_temps = np.full(job_count, 20.)
+    hints = [b''] * job_count
+    jobs_left = np.full(len(puzzles), 4)
+
+    def submit(job):
+        if start_temps[job] < 0.5:
+            start_temps[job] = 20.
+            hints[job] = b''
+        elif halve_every_round:
+            start_temps[job] *= 0.5
+        batch.submit(job, _BUDGET_MS - elapsed[job], puzzles[job // 4],
+                     hints[job], schedule(start_temps[job]))
+
+    with AnnealBatch() as batch:
+        # Keep a couple of jobs queued per core.
+        pending = iter(range(job_count))
+        for job in itertools.islice(pending, 2 * os.cpu_count()):
+            submit(job)
+
+        for job, state, time_ms, final in batch.results():
+            elapsed[job] += time_ms
+
+            # A TIMEOUT means the budget ran out mid-anneal; the job failed.
+            if state == 'GLASS' and elapsed[job] < _BUDGET_MS:
+                start_temps[job] *= .5
+                hints[job] = final
+                submit(job)  # Reanneal
                 continue
-            puzzle = '\n'.join(' '.join(puzzle.replace(
-                '.', '_')[i*9:(i+1)*9]) for i in range(9))
-            puzzles.append(puzzle)
+            elif state == 'SUCCESS' and elapsed[job] <= _BUDGET_MS:
+                times[job // 4, job % 4] = elapsed[job]
 
-    print('Finished parsing puzzles.')
+            hints[job] = b''
+            jobs_left[job // 4] -= 1
+            if jobs_left[job // 4] == 0:
+                print(job // 4, times[job // 4], flush=True)
+
+            job = next(pending, None)
+            if job is not None:
+                submit(job)
 
-    if os.path.exists('annealing.remelt.top1465.log'):
-        shutil.copy('annealing.remelt.top1465.log',
-                    f'annealing.remelt.top1465.log.{random.randint(0, 1000)}.bak')
-        os.remove('annealing.remelt.top1465.log')
-
-    orig_schedule = np.loadtxt('remelt.schedule', delimiter='\t')
-
-    with open('annealing.remelt.top1465.log', 'w') as outfile:
-        outfile.write(
-            '# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
-        for i, puzzle in enumerate(puzzles):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                times = [*executor.map(_thread_top1465_remelt, ((orig_schedule, puzzle) for _ in range(4)))]
-            times = np.array(times)
-            print(times, flush=True)
-            outfile.write(
-                f'{i}\t'
-                f'{np.count_nonzero(times[times < 0.]) / 4.}\t'
-                f'{np.average(times[times >= 0.]) if not (times < 0).all() else 0.}\n')
-
-
-def _thread_top1465_remelt(args):
-    orig_schedule, puzzle = args
-    with NamedTemporaryFile(delete=True) as puzzlefile, \
-            NamedTemporaryFile(delete=True) as hintfile:
-        puzzlefile.write(puzzle.encode('utf-8'))
-        puzzlefile.flush()
-
-        start_time = time.perf_counter()
-        start_temp = 20.
-        args = []
-        while True:
-            if time.perf_counter() - start_time > 90:
-                break
-
-            if start_temp < 0.5:
-                start_temp = 20.
-                args = []
-            else:
-                start_temp *= 0.5
-
-            schedule = orig_schedule.copy()
-            schedule[:,0] *= start_temp
-            schedule = '\n'.join('%.6g\t%d' % (line[0], line[1]) for line in schedule)
-
-            try:
-                result = run(
-                    ['../target/release/annealing', puzzlefile.name, '-', *args],
-                    input=schedule.encode('utf-8'),
-                    timeout=(start_time + 90 - time.perf_counter()),
-                    capture_output=True)
-            except TimeoutExpired:
-                break
-
-            if result.returncode != 0:
-                raise Exception(result.stdout.decode('utf-8') +
-                                '\n' + result.stderr.decode('utf-8'))
-
-            output = result.stdout.decode('utf-8')
-            state = output[:output.find('\n')].strip()
-            final = output[output.find('\n')+1:].strip()
-
-            if state == 'GLASS':
-                start_temp *= .5
-                hintfile.seek(0)
-                hintfile.truncate()
-                hintfile.write(final.encode('utf-8'))
-                hintfile.flush()
-                args = [hintfile.name]
-                continue  # Reanneal
-            elif state == 'SUCCESS':
-                return (time.perf_counter() - start_time) * 1000
-    return -1
+    return times
 
 
 if __name__ == '__main__':
@@ -11,17 +11,18 @@ Options:
     --help      Show this screen
 """
 
+import io
 import random
 import subprocess
 import os
 import numpy as np
-import shutil
 import docopt
 from glob import glob
+from common import ensure_built, load_top1465
 
 
 def main():
-    subprocess.run('cargo build --release', shell=True)
+    ensure_built('backtrack')
     arguments = docopt.docopt(__doc__)
 
     if arguments['top1465']:
@@ -32,67 +33,75 @@ def main():
         print('What?')
 
 def bench_top1465():
-    puzzles = []
-    with open('top1465', 'r') as top1465:
-        for puzzle in top1465.readlines():
-            puzzle = puzzle.strip()
-            if not puzzle:
-                continue
-            puzzle = '\n'.join(' '.join(puzzle.replace('.', '_')[i*9:(i+1)*9]) for i in range(9))
-            puzzles.append(puzzle)
-
-    #split = 293
+    puzzles = load_top1465()
 
     if os.path.exists('backtrack.top1465.log'):
-        shutil.copy('backtrack.top1465.log', f'backtrack.top1465.log.{random.randint(0, 1000)}.bak')
-        os.remove('backtrack.top1465.log')
-        
-    with open('backtrack.top1465.log', 'w') as outfile:
-        outfile.write('# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
-        for i, puzzle in enumerate(puzzles):
-            puzzle_bytes = puzzle.encode('utf-8')
-            try:
-                out = subprocess.run(
-                        ["../target/release/backtrack",
-                            "--benchmark", "-", "-"],
-                        input=puzzle_bytes,
-                        capture_output=True,
-                        timeout=90) # Timeout of 1.5 minutes
-                print(out.stderr.decode('utf-8'))
-                data = np.fromstring(out.stdout, sep='\n')
-                unsolved = np.count_nonzero(data < 0.) / data.shape[0]
-                solve_time = np.average(data[data >= 0.]) if unsolved < 1. else -1.
-            except subprocess.TimeoutExpired:
-                unsolved = 1.
-                solve_time = -1.
-            outfile.write(f'{i}\t{unsolved}\t{solve_time}\n')
+        os.rename('backtrack.top1465.log',
+                  f'backtrack.top1465.log.{random.randint(0, 1000)}.bak')
+
+    results = _benchmark_batch(puzzles)
+
+    np.savetxt('backtrack.top1465.log',
+               np.column_stack([np.arange(len(puzzles)), results]),
+               fmt=['%d', '%.6f', '%.6f'],
+               delimiter='\t',
+               header='<Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>')
+
+    # Keep a binary copy alongside the log, so that plot.py need not parse it.
+    # This must be written after the log: plot.py only trusts a copy that is
+    # at least as new as its log.
+    data = np.empty(len(puzzles), dtype=[('puzzle', 'i4'),
+                                         ('frac_failed', 'f4'),
+                                         ('ms_time_avg', 'f4')])
+    data['puzzle'] = np.arange(len(puzzles))
+    data['frac_failed'] = results[:, 0]
+    data['ms_time_avg'] = results[:, 1]
+    np.save('backtrack.top1465.npy', data)
 
 def bench_paper():
+    puzzlefiles = glob('paper/*.sudoku')
+    puzzles = []
+    for puzzle in puzzlefiles:
+        with open(puzzle, 'rb') as puzzlebuf:
+            puzzles.append(puzzlebuf.read())
+
     if os.path.exists('backtrack.paper.log'):
-        shutil.copy('backtrack.paper.log', f'backtrack.paper.log.{random.randint(0, 1000)}.bak')
-        os.remove('backtrack.paper.log')
-        
+        os.rename('backtrack.paper.log',
+                  f'backtrack.paper.log.{random.randint(0, 1000)}.bak')
+
+    results = _benchmark_batch(puzzles)
+
     with open('backtrack.paper.log', 'w') as outfile:
         outfile.write('# <Puzzle name>\t<Unsolved fraction>\t<average solve time (ms)>\n')
-        for puzzle in glob('paper/*.sudoku'):
-            with open(puzzle, 'r') as puzzlebuf:
-                puzzle_bytes = puzzlebuf.read().encode('utf-8')
-            try:
-                out = subprocess.run(
-                        ["../target/release/backtrack",
-                            "--benchmark", "-", "-"],
-                        input=puzzle_bytes,
-                        capture_output=True,
-                        timeout=90) # Timeout of 1.5 minutes
-                print(out.stderr.decode('utf-8'))
-                data = np.fromstring(out.stdout, sep='\n')
-                print(data)
-                unsolved = np.count_nonzero(data < 0.) / data.shape[0]
-                solve_time = np.average(data[data >= 0.])
-            except subprocess.TimeoutExpired:
-                unsolved = 1.
-                solve_time = -1.
+        for puzzle, (unsolved, solve_time) in zip(puzzlefiles, results):
             outfile.write(f'{os.path.basename(puzzle)}\t{unsolved}\t{solve_time}\n')
 
+def _benchmark_batch(puzzles):
+    """Benchmark all of `puzzles` with a single `backtrack --benchmark-batch`
+    process, giving up on each after 1.5 minutes. Returns a (puzzles, 2) array
+    of the unsolved fraction and average solve time (ms, or -1) of each."""
+    results = np.tile([1., -1.], (len(puzzles), 1))
+    try:
+        out = subprocess.run(
+                ["../target/release/backtrack",
+                    "--benchmark-batch", "--timeout=90"],
+                input=b'\n===\n'.join(puzzles),
+                capture_output=True,
+                timeout=90 * len(puzzles) + 60,
+                check=True)
+        stdout = out.stdout
+    except subprocess.TimeoutExpired as e:
+        # Should not happen, but keep whatever got done, up to the last line
+        # that was written out in full.
+        stdout = e.stdout or b''
+        stdout = stdout[:stdout.rfind(b'\n') + 1]
+    except subprocess.CalledProcessError as e:
+        print(e.stderr.decode('utf-8'))
+        raise
+
+    data = np.loadtxt(io.BytesIO(stdout), ndmin=2).reshape(-1, 3)
+    results[data[:, 0].astype(int)] = data[:, 1:]
+    return results
+
 if __name__ == '__main__':
     main()
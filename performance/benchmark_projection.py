@@ -12,18 +12,17 @@ Options:
 """
 
 import os
-import shutil
+import asyncio
 import random
-import concurrent.futures
-from tempfile import NamedTemporaryFile
 import numpy as np
 from glob import glob
 from time import perf_counter
 from docopt import docopt
-from subprocess import TimeoutExpired, run
+from subprocess import PIPE
+from common import ensure_built, load_top1465, write_log
 
 def main():
-    run('cargo build --release', shell=True)
+    ensure_built('projection')
     arguments = docopt(__doc__)
 
     if arguments['paper']:
@@ -36,102 +35,78 @@ def main():
 
 def benchmark_paper():
     if os.path.exists('projection.log'):
-        shutil.copy('projection.log',
-                    f'projection.log.{random.randint(0, 1000)}.bak')
-        os.remove('projection.log')
-
-    with open('projection.log', 'w') as outfile:
-        outfile.write(
-            '# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
-        for puzzlefile in glob('paper/*.sudoku'):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                times = [*executor.map(_thread_benchmark_paper, (puzzlefile for _ in range(4)))]
-            times = np.array(times)
-            print(times, flush=True)
-            outfile.write(
-                f'"{puzzlefile}"\t'
-                f'{np.count_nonzero(times[times < 0.]) / 4.}\t'
-                f'{np.average(times[times >= 0.]) if not (times < 0).all() else 0.}\n')
-
-
-def _thread_benchmark_paper(puzzlefile):
-    try:
-        start_time = perf_counter()
-        out = run(['../target/release/projection', '100_000_000', puzzlefile],
-            timeout=90,
-            capture_output=True)
-        end_time = perf_counter()
-        if out.returncode != 0:
-            raise Exception(out.stderr.decode('utf-8'))
-            
-        stdout = out.stdout.decode('utf-8')
-        state = stdout[:stdout.find('\n')].strip()
-        final = stdout[stdout.find('\n')+1:].strip()
-
-        if state == 'EXHAUSTED':
-            return -1
-        elif state == 'ALL SATISFIED':
-            return ((end_time - start_time) * 1000)
-    except TimeoutExpired:
-        return -1
-    
+        os.rename('projection.log',
+                  f'projection.log.{random.randint(0, 1000)}.bak')
+
+    puzzlefiles = glob('paper/*.sudoku')
+    puzzles = []
+    for puzzlefile in puzzlefiles:
+        with open(puzzlefile, 'rb') as puzzlebuf:
+            puzzles.append(puzzlebuf.read())
+
+    times = np.array(asyncio.run(_benchmark(puzzles)))
+
+    write_log('projection.log', times,
+              labels=(f'"{puzzlefile}"' for puzzlefile in puzzlefiles))
 
 
 def benchmark_top1465():
-    puzzles = []
-    with open('top1465', 'r') as top1465:
-        for puzzle in top1465.readlines():
-            puzzle = puzzle.strip()
-            if not puzzle:
-                continue
-            puzzle = '\n'.join(' '.join(puzzle.replace(
-                '.', '_')[i*9:(i+1)*9]) for i in range(9))
-            puzzles.append(puzzle)
+    puzzles = load_top1465()
 
     print('Finished parsing puzzles.')
 
     if os.path.exists('projection.top1465.log'):
-        shutil.copy('projection.top1465.log',
-                    f'projection.top1465.log.{random.randint(0, 1000)}.bak')
-        os.remove('projection.top1465.log')
-
-    with open('projection.top1465.log', 'w') as outfile:
-        outfile.write(
-            '# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
-        for i, puzzle in enumerate(puzzles):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                times = [*executor.map(_thread_benchmark_top1465, (puzzle for _ in range(4)))]
-            times = np.array(times)
-            print(times, flush=True)
-            outfile.write(
-                f'{i}\t'
-                f'{np.count_nonzero(times[times < 0.]) / 4.}\t'
-                f'{np.average(times[times >= 0.]) if not (times < 0).all() else 0.}\n')
-
-
-def _thread_benchmark_top1465(puzzle):
-    with NamedTemporaryFile(delete=True) as puzzlefile:
-        puzzlefile.write(puzzle.encode('utf-8'))
-        puzzlefile.flush()
-        try:
-            start_time = perf_counter()
-            out = run(['../target/release/projection', '100_000_000', puzzlefile.name],
-                timeout=90,
-                capture_output=True)
-            end_time = perf_counter()
-            if out.returncode != 0:
-                raise Exception(out.stderr.decode('utf-8'))
-                
-            stdout = out.stdout.decode('utf-8')
-            state = stdout[:stdout.find('\n')].strip()
-            final = stdout[stdout.find('\n')+1:].strip()
-
-            if state == 'EXHAUSTED':
-                return -1
-            elif state == 'ALL SATISFIED':
-                return ((end_time - start_time) * 1000)
-        except TimeoutExpired:
-            return -1
+        os.rename('projection.top1465.log',
+                  f'projection.top1465.log.{random.randint(0, 1000)}.bak')
+
+    times = np.array(asyncio.run(_benchmark(puzzles)))
+
+    write_log('projection.top1465.log', times)
+
+
+async def _benchmark(puzzles):
+    """Run the solver 4 times on each of `puzzles`, keeping one solver
+    running per core, and return the solve times of each."""
+    semaphore = asyncio.Semaphore(os.cpu_count())
+
+    async def benchmark_puzzle(i, puzzle):
+        times = await asyncio.gather(
+            *(_benchmark_run(puzzle, semaphore) for _ in range(4)))
+        print(i, times, flush=True)
+        return times
+
+    return await asyncio.gather(
+        *(benchmark_puzzle(i, puzzle) for i, puzzle in enumerate(puzzles)))
+
+
+async def _benchmark_run(puzzle, semaphore):
+    async with semaphore:
+        return await _solve_time(
+            ['../target/release/projection', '100_000_000', '-'], puzzle)
+
+
+async def _solve_time(args, puzzle):
+    """Run the projection solver with `args`, giving it `puzzle` on stdin, and
+    return how long it took to solve the puzzle (in ms), or -1 if it didn't
+    within 1m30s."""
+    start_time = perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *args, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(puzzle), 90)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return -1
+    end_time = perf_counter()
+
+    if proc.returncode != 0:
+        raise Exception(stderr.decode('utf-8'))
+
+    state, _, _ = stdout.partition(b'\n')
+    if state.strip() == b'ALL SATISFIED':
+        return ((end_time - start_time) * 1000)
+    return -1
 
 
 if __name__ == '__main__':
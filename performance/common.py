@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Helpers shared by the benchmark scripts, which are run from this directory.
+"""
+
+import os
+import mmap
+import numpy as np
+from glob import glob
+from subprocess import run
+
+
+def ensure_built(binary):
+    """Build the solvers, unless the `binary` solver (e.g. 'annealing') is
+    already newer than all of the sources."""
+    binary = f'../target/release/{binary}'
+    sources = [*glob('../*/src/**/*.rs', recursive=True),
+               *glob('../*/Cargo.toml'), '../Cargo.toml']
+    if (not os.path.exists(binary) or
+            max(map(os.path.getmtime, sources)) > os.path.getmtime(binary)):
+        run(['cargo', 'build', '--release'], check=True)
+
+
+def write_log(path, times, labels=None):
+    """Write the unsolved fraction and average solve time of each puzzle to
+    `path`, given a (puzzles, 4) array of solve times in ms, with -1 for failed
+    runs. Puzzles that were never solved get an average time of 0.
+
+    Each row is labelled with the puzzle's index, or with its entry in
+    `labels`, if given.
+    """
+    failed = times < 0.
+    unsolved = np.count_nonzero(failed, axis=1) / times.shape[1]
+    average_time = (np.where(failed, 0., times).sum(axis=1) /
+                    np.maximum(np.count_nonzero(~failed, axis=1), 1))
+    if labels is None:
+        labels = range(len(times))
+
+    with open(path, 'w') as outfile:
+        outfile.write(
+            '# <Puzzle index>\t<Unsolved percentage>\t<Average solve time (ms)>\n')
+        outfile.writelines(
+            f'{label}\t{u:.4f}\t{t:.6f}\n'
+            for label, u, t in zip(labels, unsolved, average_time))
+
+
+def load_top1465():
+    """Read the puzzles in top1465, which are given one per line as 81 cells
+    with '.' for blanks, as a list of bytes in .sudoku format."""
+    malformed = Exception(
+        'top1465 should have exactly one puzzle of 81 cells on each line, with '
+        'no blank lines or \\r\\n line endings.')
+
+    with open('top1465', 'rb') as top1465:
+        if os.fstat(top1465.fileno()).st_size == 0:
+            raise malformed  # An empty file can't be mapped.
+        raw = np.frombuffer(
+            mmap.mmap(top1465.fileno(), 0, access=mmap.ACCESS_READ),
+            dtype=np.uint8)
+
+    # Ignoring trailing newlines, every puzzle should be 81 cells followed by a
+    # newline (bar the last), so that the cells can be gathered straight out of
+    # the mapped file.
+    contents = np.flatnonzero(raw != ord('\n'))
+    if len(contents) == 0:
+        raise malformed
+    end = contents[-1] + 1
+    count = (end + 1) // 82
+    if end != 82 * count - 1 or (raw[81:end:82] != ord('\n')).any():
+        raise malformed
+    cells = raw[np.arange(count)[:, None] * 82 + np.arange(81)].reshape(-1, 9, 9)
+
+    # Lay each row out as "c c c c c c c c c\n".
+    sudoku = np.full((len(cells), 9, 18), ord(' '), dtype=np.uint8)
+    sudoku[:, :, 0::2] = np.where(cells == ord('.'), ord('_'), cells)
+    sudoku[:, :, 17] = ord('\n')
+
+    return [puzzle.tobytes() for puzzle in sudoku.reshape(len(cells), -1)]
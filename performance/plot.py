@@ -14,15 +14,48 @@ Options:
 """
 
 from shutil import which
+import os
+import functools
+import matplotlib
+if not os.environ.get('DISPLAY'):
+    matplotlib.use('Agg')  # Only ever saving to files, anyway
 import matplotlib.pyplot as plt
 import numpy as np
 from docopt import docopt
 
 
+def load_log(path, puzzle_format='i4', seconds=False):
+    """Load a benchmark log, or its binary .npy copy, if the benchmark wrote
+    one and the log has not changed since. If `seconds`, solve times are
+    converted from ms to seconds.
+
+    The result is cached until the file changes, and so is read-only; copy it
+    before modifying it.
+    """
+    binary = os.path.splitext(path)[0] + '.npy'
+    if os.path.exists(binary) and (
+            not os.path.exists(path) or
+            os.path.getmtime(binary) >= os.path.getmtime(path)):
+        path = binary
+    return _load_log(path, os.path.getmtime(path), puzzle_format, seconds)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_log(path, mtime, puzzle_format, seconds):
+    if path.endswith('.npy'):
+        data = np.load(path)
+    else:
+        data = np.loadtxt(path, delimiter='\t',
+                          dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
+                                 'formats': (puzzle_format, 'f4', 'f4')})
+    if seconds:
+        data['ms_time_avg'] /= 1000
+    data.flags.writeable = False
+    return data
+
+
 def plot_backtrack_paper():
-    data = np.loadtxt('backtrack.paper.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('S25', 'f4', 'f4')})
+    data = load_log('backtrack.paper.log', puzzle_format='S25')
 
     assert (data['frac_failed'] == 0.).all()
 
@@ -48,10 +81,7 @@ def plot_backtrack_paper():
 
 
 def plot_backtrack_top1465():
-    data = np.loadtxt('backtrack.top1465.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    data['ms_time_avg'] /= 1000  # Convert to seconds
+    data = load_log('backtrack.top1465.log', seconds=True)
 
     x = np.arange(data['puzzle'].shape[0])
 
@@ -68,7 +98,7 @@ def plot_backtrack_top1465():
     ax1.set_xticks([])
 
     top50 = non_failed[non_failed_key[:50]]
-    p95 = non_failed[non_failed_key[non_failed_key[int(.05 * non_failed_key.shape[0]):]]]
+    p95 = non_failed[non_failed_key[int(.05 * non_failed_key.shape[0]):]]
 
     ax1.axhline(np.average(non_failed), color='#D23D3D',
                 label='average ({:.3f}s)'.format(np.average(non_failed)), linestyle='--')
@@ -100,19 +130,13 @@ def plot_schedules():
     ax1.set_ylabel('Reduced Temperature', color='#C23D3E')
     ax2.set_ylabel('Iterations', color='#3DC23E')
 
-    temperatures = []
-    iterations = []
-
-    iteration = 1.
-    total_iters = 0
-    temperature = 1.
-    while int(total_iters) < 100000:
-        iterations.append(int(iteration))
-        temperatures.append(temperature)
-
-        temperature *= 0.99
-        iteration *= 1.01
-        total_iters += int(iteration)
+    # Step k runs int(1.01**k) iterations at temperature 0.99**k; steps are
+    # added while the total iterations after the first step are below 100_000.
+    steps = np.arange(2000)  # More than enough
+    iterations = (1.01**steps).astype(np.int64)
+    steps = steps[:1 + np.searchsorted(np.cumsum(iterations[1:]), 100000)]
+    iterations = iterations[:len(steps)]
+    temperatures = 0.99**steps
 
     ax1.scatter(np.arange(len(temperatures)),
                 temperatures, color='#C23D3E', marker='1')
@@ -143,10 +167,7 @@ def plot_schedules():
 
 
 def plot_geometric_paper():
-    data = np.loadtxt('annealing.paper.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    data['ms_time_avg'] /= 1000  # Convert to seconds
+    data = load_log('annealing.paper.log', seconds=True)
 
     fig, ax1 = plt.subplots(figsize=(12, 6))
     ax2 = ax1.twinx()
@@ -175,10 +196,7 @@ def plot_geometric_paper():
 
 
 def plot_geometric_top1465():
-    data = np.loadtxt('annealing.top1465.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    data['ms_time_avg'] /= 1000  # Convert to seconds
+    data = load_log('annealing.top1465.log', seconds=True)
 
     fig, ax1 = plt.subplots(figsize=(12, 6))
     ax2 = ax1.twinx()
@@ -207,15 +225,9 @@ def plot_geometric_top1465():
 
 
 def plot_remelt_paper():
-    data = np.loadtxt('annealing.remelt.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    data['ms_time_avg'] /= 1000  # Convert to seconds
+    data = load_log('annealing.remelt.log', seconds=True)
 
-    compare_data = np.loadtxt('annealing.paper.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    compare_data['ms_time_avg'] /= 1000  # Convert to seconds
+    compare_data = load_log('annealing.paper.log', seconds=True)
 
     fig, ax1 = plt.subplots(figsize=(12, 6))
     ax2 = ax1.twinx()
@@ -254,15 +266,9 @@ def plot_remelt_paper():
 
 
 def plot_remelt_top1465():
-    data = np.loadtxt('annealing.remelt.top1465.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    data['ms_time_avg'] /= 1000  # Convert to seconds
+    data = load_log('annealing.remelt.top1465.log', seconds=True)
 
-    compare_data = np.loadtxt('annealing.top1465.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    compare_data['ms_time_avg'] /= 1000  # Convert to seconds
+    compare_data = load_log('annealing.top1465.log', seconds=True)
 
 
     fig, ax1 = plt.subplots(figsize=(12, 6))
@@ -301,10 +307,7 @@ def plot_remelt_top1465():
 
 
 def plot_projection_paper():
-    data = np.loadtxt('projection.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('i1', 'f4', 'f4')})
-    data['ms_time_avg'] /= 1000  # Convert to seconds
+    data = load_log('projection.log', puzzle_format='S25', seconds=True)
 
     fig, ax1 = plt.subplots(figsize=(12, 6))
     ax2 = ax1.twinx()
@@ -332,10 +335,7 @@ def plot_projection_paper():
 
 
 def plot_projection_top1465():
-    data = np.loadtxt('projection.top1465.log', delimiter='\t',
-                      dtype={'names': ('puzzle', 'frac_failed', 'ms_time_avg'),
-                             'formats': ('S24', 'f4', 'f4')})
-    data['ms_time_avg'] /= 1000  # Convert to seconds
+    data = load_log('projection.top1465.log', puzzle_format='S24', seconds=True)
 
     assert ((data['frac_failed'] == 1.) | (data['frac_failed'] == 0.)).all()
 
@@ -354,7 +354,7 @@ def plot_projection_top1465():
     ax1.set_xticks([])
 
     top50 = non_failed[non_failed_key[:50]]
-    p95 = non_failed[non_failed_key[non_failed_key[int(.05 * non_failed_key.shape[0]):]]]
+    p95 = non_failed[non_failed_key[int(.05 * non_failed_key.shape[0]):]]
 
     ax1.axhline(np.average(non_failed), color='#D23D3D',
                 label='average ({:.3f}s)'.format(np.average(non_failed)), linestyle='--')
@@ -1,8 +1,8 @@
-# Generates the ../remelt.schedule file.
+# Generates the ../remelt.schedule file. Pass --plot to see the schedule.
 
 import numpy as np
-import matplotlib.pyplot as plt
 import os
+import sys
 
 if __name__ == '__main__':
     time = np.linspace(0., 1., 300)
@@ -14,8 +14,11 @@ if __name__ == '__main__':
     #plt.plot(time, iterations)
 
     temperature = np.exp(-np.tan(time * 0.9 * np.pi / 2.)) * remelts
-    plt.plot(time, temperature)
-    plt.show()
+
+    if '--plot' in sys.argv:
+        import matplotlib.pyplot as plt
+        plt.plot(time, temperature)
+        plt.show()
 
     here = os.path.dirname(os.path.realpath(__file__))
     np.savetxt(